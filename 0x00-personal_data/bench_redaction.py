@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of row redaction
+
+Compares building key=value messages and masking them with filter_datum's
+regex against redacting rows by column position before formatting them.
+"""
+import sys
+import time
+from typing import Callable
+from filtered_logger import (PII_FIELDS, RedactingFormatter, filter_datum,
+                             format_row, format_row_json, numpy,
+                             redact_rows, redacted_positions)
+
+COLUMNS = ("name", "email", "phone", "ssn", "password", "ip", "last_login",
+           "user_agent")
+
+
+def make_rows(count: int) -> list:
+    """
+    Builds synthetic user rows.
+
+    Args:
+        count (int): Number of rows.
+
+    Returns:
+        list: Rows matching COLUMNS.
+    """
+    return [(f"user{i}", f"user{i}@example.com", f"(555) 010-{i % 10000:04}",
+             f"{i % 1000:03}-00-{i % 10000:04}", "$2b$12$" + "x" * 53,
+             f"10.0.{i % 256}.{i % 251}", "2019-11-14 06:16:24",
+             "Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
+            for i in range(count)]
+
+
+def regex_path(rows: list) -> int:
+    """
+    Redacts rows the way main() used to: format, then regex.
+
+    Args:
+        rows (list): Rows to redact.
+
+    Returns:
+        int: Total length of the produced messages.
+    """
+    total = 0
+    for row in rows:
+        message = "".join("{}={}; ".format(key, value)
+                          for key, value in zip(COLUMNS, row))
+        total += len(filter_datum(PII_FIELDS, RedactingFormatter.REDACTION,
+                                  message.strip(),
+                                  RedactingFormatter.SEPARATOR))
+    return total
+
+
+def positional_path(rows: list, vectorize: bool = False,
+                    formatter: Callable = format_row) -> int:
+    """
+    Redacts rows by position in batches, then formats them.
+
+    Args:
+        rows (list): Rows to redact.
+        vectorize (bool): Use the numpy path of redact_rows.
+        formatter (Callable): Row formatter.
+
+    Returns:
+        int: Total length of the produced messages.
+    """
+    positions = redacted_positions(COLUMNS)
+    total = 0
+    for i in range(0, len(rows), 1000):
+        for row in redact_rows(rows[i:i + 1000], positions,
+                               vectorize=vectorize):
+            total += len(formatter(COLUMNS, row))
+    return total
+
+
+def report(name: str, func: Callable, rows: list) -> None:
+    """
+    Times a redaction path and prints its throughput.
+
+    Args:
+        name (str): Label of the path.
+        func (Callable): Path to run over the rows.
+        rows (list): Rows to redact.
+    """
+    start = time.perf_counter()
+    func(rows)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24} {len(rows) / elapsed:>12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    rows = make_rows(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
+    report("regex", regex_path, rows)
+    report("positional", positional_path, rows)
+    if numpy is not None:
+        report("positional (numpy)",
+               lambda r: positional_path(r, vectorize=True), rows)
+    report("positional jsonl",
+           lambda r: positional_path(r, formatter=format_row_json), rows)
@@ -4,21 +4,31 @@ A logging module that redacts sensitive personal information (PII)
 from log messages.
 """
 
+import json
 import logging
 import re
-from typing import Tuple
+from typing import List, Sequence, Tuple
 import os
 import mysql.connector
 from mysql.connector import errorcode
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Define PII fields from the given CSV structure
 PII_FIELDS: Tuple[str, ...] = ("name", "email", "phone", "ssn", "password")
 
 
-def get_logger() -> logging.Logger:
+def get_logger(fields: Tuple[str, ...] = PII_FIELDS) -> logging.Logger:
     """
     Creates and configures a logger to redact sensitive information.
 
+    Args:
+        fields (Tuple[str, ...]): Fields the formatter redacts. Pass an
+        empty tuple when messages are already redacted.
+
     Returns:
         logging.Logger: Configured logger.
     """
@@ -28,7 +38,7 @@ def get_logger() -> logging.Logger:
 
     # Create a StreamHandler with RedactingFormatter
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    stream_handler.setFormatter(RedactingFormatter(fields))
     logger.addHandler(stream_handler)
 
     return logger
@@ -64,6 +74,8 @@ class RedactingFormatter(logging.Formatter):
             str: The formatted and redacted log message.
         """
         original_message = super().format(record)
+        if not self.fields:
+            return original_message
         return filter_datum(
             self.fields, self.REDACTION, original_message, self.SEPARATOR)
 
@@ -87,6 +99,82 @@ def filter_datum(fields: Tuple[str, ...],
     return re.sub(pattern, lambda m: f"{m.group(1)}={redaction}", message)
 
 
+def redacted_positions(columns: Sequence[str],
+                       fields: Tuple[str, ...] = PII_FIELDS
+                       ) -> Tuple[int, ...]:
+    """
+    Finds the positions of the columns to redact in a row.
+
+    Args:
+        columns (Sequence[str]): Column names, e.g. cursor.column_names.
+        fields (Tuple[str, ...]): Field names to obfuscate.
+
+    Returns:
+        Tuple[int, ...]: Positions of the columns listed in fields.
+    """
+    return tuple(i for i, column in enumerate(columns) if column in fields)
+
+
+def redact_rows(rows: Sequence[Sequence], positions: Tuple[int, ...],
+                redaction: str = RedactingFormatter.REDACTION,
+                vectorize: bool = False) -> List[list]:
+    """
+    Obfuscates the values at the given positions in a batch of rows.
+
+    Args:
+        rows (Sequence[Sequence]): Rows to redact.
+        positions (Tuple[int, ...]): Positions from redacted_positions.
+        redaction (str): The string to replace the values with.
+        vectorize (bool): Redact the whole batch as a numpy array when
+        numpy is installed.
+
+    Returns:
+        List[list]: The redacted rows.
+    """
+    if vectorize and numpy is not None and rows and positions:
+        batch = numpy.array(rows, dtype=object)
+        batch[:, list(positions)] = redaction
+        return batch.tolist()
+    redacted = []
+    for row in rows:
+        row = list(row)
+        for i in positions:
+            row[i] = redaction
+        redacted.append(row)
+    return redacted
+
+
+def format_row(columns: Sequence[str], row: Sequence,
+               separator: str = RedactingFormatter.SEPARATOR) -> str:
+    """
+    Formats a row as a log message of key=value pairs.
+
+    Args:
+        columns (Sequence[str]): Column names.
+        row (Sequence): Column values.
+        separator (str): The field separator.
+
+    Returns:
+        str: The log message.
+    """
+    return " ".join("{}={}{}".format(key, value, separator)
+                    for key, value in zip(columns, row))
+
+
+def format_row_json(columns: Sequence[str], row: Sequence) -> str:
+    """
+    Formats a row as a JSON object on a single line.
+
+    Args:
+        columns (Sequence[str]): Column names.
+        row (Sequence): Column values.
+
+    Returns:
+        str: The JSON line.
+    """
+    return json.dumps(dict(zip(columns, row)), default=str)
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """
     Connects to a MySQL database using environment variables.
@@ -135,16 +223,26 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
 def main():
     """
     Main function to retrieve and log user data from a MySQL database.
+
+    Rows are redacted by column position as they are fetched, so the
+    logger does not need to search the messages again. Set
+    PERSONAL_DATA_LOG_FORMAT=jsonl to print one JSON object per row.
     """
+    jsonl = os.getenv('PERSONAL_DATA_LOG_FORMAT') == 'jsonl'
     db = get_db()
-    logger = get_logger()
+    logger = get_logger(())
     cursor = db.cursor()
     cursor.execute("SELECT * FROM users;")
     fields = cursor.column_names
-    for row in cursor:
-        message = "".join("{}={}; ".format(key, value) for key, value in zip(
-            fields, row))
-        logger.info(message.strip())
+    positions = redacted_positions(fields)
+    rows = cursor.fetchmany(1000)
+    while rows:
+        for row in redact_rows(rows, positions):
+            if jsonl:
+                print(format_row_json(fields, row))
+            else:
+                logger.info(format_row(fields, row))
+        rows = cursor.fetchmany(1000)
     cursor.close()
     db.close()
 
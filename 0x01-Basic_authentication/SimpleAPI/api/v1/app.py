@@ -9,60 +9,84 @@ from flask_cors import (CORS, cross_origin)
 import os
 
 
-app = Flask(__name__)
-app.register_blueprint(app_views)
-CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
-auth = None
-AUTH_TYPE = os.getenv("AUTH_TYPE")
-if AUTH_TYPE == "auth":
-    from api.v1.auth.auth import Auth
-    auth = Auth()
-elif AUTH_TYPE == "basic_auth":
-    from api.v1.auth.basic_auth import BasicAuth
-    auth = BasicAuth()
-
-
-@app.before_request
-def bef_req():
+def get_auth(auth_type: str):
     """
-    Filter each request before it's handled by the proper route
+    Build the authentication instance matching the given type
+    Args:
+        auth_type (str): "auth", "basic_auth" or None
+    Return:
+        the auth instance, or None when no authentication is used
     """
-    if auth is None:
-        pass
-    else:
-        excluded = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/'
-        ]
-        if auth.require_auth(request.path, excluded):
-            if auth.authorization_header(request) is None:
-                abort(401, description="Unauthorized")
-            if auth.current_user(request) is None:
-                abort(403, description="Forbidden")
-
-
-@app.errorhandler(404)
+    if auth_type == "auth":
+        from api.v1.auth.auth import Auth
+        return Auth()
+    if auth_type == "basic_auth":
+        from api.v1.auth.basic_auth import BasicAuth
+        return BasicAuth()
+    return None
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Build a new Flask application
+    Args:
+        config (dict): settings overriding the environment, e.g. AUTH_TYPE
+    Return:
+        Flask application
+    """
+    app = Flask(__name__)
+    app.config["AUTH_TYPE"] = os.getenv("AUTH_TYPE")
+    app.config.update(config or {})
+    app.register_blueprint(app_views)
+    CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
+    auth = get_auth(app.config["AUTH_TYPE"])
+
+    @app.before_request
+    def bef_req():
+        """
+        Filter each request before it's handled by the proper route
+        """
+        if auth is None:
+            pass
+        else:
+            excluded = [
+                '/api/v1/status/',
+                '/api/v1/unauthorized/',
+                '/api/v1/forbidden/'
+            ]
+            if auth.require_auth(request.path, excluded):
+                if auth.authorization_header(request) is None:
+                    abort(401, description="Unauthorized")
+                if auth.current_user(request) is None:
+                    abort(403, description="Forbidden")
+
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(401, unauthorized)
+    app.register_error_handler(403, forbidden)
+    return app
+
+
 def not_found(error) -> str:
     """ Not found handler
     """
     return jsonify({"error": "Not found"}), 404
 
 
-@app.errorhandler(401)
 def unauthorized(error) -> str:
     """ Request unauthorized handler
     """
     return jsonify({"error": "Unauthorized"}), 401
 
 
-@app.errorhandler(403)
 def forbidden(error) -> str:
     """ Request unauthorized handler
     """
     return jsonify({"error": "Forbidden"}), 403
 
 
+app = create_app()
+
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+The activity module
+
+Buffers the time each user was last seen so that session expiry can be
+checked on every request without writing to the database each time. A
+background thread writes the buffer back in one batched statement every
+flush interval, and once more when the process exits.
+"""
+from datetime import datetime, timedelta
+from storage import Storage
+from typing import Dict, Optional
+import atexit
+import logging
+import threading
+
+
+class ActivityBuffer:
+    """
+    Write-behind buffer of users' last-seen times
+    """
+
+    def __init__(self, db: Storage, flush_interval: float = 5.0,
+                 max_age: timedelta = None) -> None:
+        """
+        Initialize a new ActivityBuffer
+        Args:
+            db (Storage): storage the buffer is flushed to
+            flush_interval (float): seconds between two flushes
+            max_age (timedelta): how long a user's last-seen time is kept
+                                 in memory, e.g. the session timeout;
+                                 kept forever when None
+        """
+        self._db = db
+        self._flush_interval = flush_interval
+        self._max_age = max_age
+        self._last_seen: Dict[int, datetime] = {}
+        self._pending: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="activity-flush")
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self) -> None:
+        """
+        Flush the buffer every flush interval until stopped
+        """
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+    def stop(self) -> None:
+        """
+        Stop the background flushes and write what is still pending
+        """
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def touch(self, user_id: int, when: datetime) -> None:
+        """
+        Record that a user was seen
+        Args:
+            user_id (int): user's id
+            when (datetime): time the user was seen
+        """
+        with self._lock:
+            self._last_seen[user_id] = when
+            self._pending[user_id] = when
+
+    def last_seen(self, user_id: int) -> Optional[datetime]:
+        """
+        Get the buffered last-seen time of a user
+        Args:
+            user_id (int): user's id
+        Return:
+            last-seen time, or None when the user was not seen here
+        """
+        return self._last_seen.get(user_id)
+
+    def forget(self, user_id: int) -> None:
+        """
+        Drop a user from the buffer, e.g. when their session ends
+        Args:
+            user_id (int): user's id
+        """
+        with self._lock:
+            self._last_seen.pop(user_id, None)
+            self._pending.pop(user_id, None)
+
+    def flush(self) -> int:
+        """
+        Write the pending last-seen times to the database, and drop the
+        ones older than max_age from memory
+        Return:
+            number of users written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._max_age is not None:
+                cutoff = datetime.utcnow() - self._max_age
+                self._last_seen = {user_id: when for user_id, when
+                                   in self._last_seen.items()
+                                   if when >= cutoff}
+        if not pending:
+            return 0
+        try:
+            self._db.set_last_seen(pending)
+        except Exception:
+            logging.getLogger(__name__).exception(
+                "could not write the session activity, will retry")
+            with self._lock:
+                for user_id, when in pending.items():
+                    self._pending.setdefault(user_id, when)
+            return 0
+        finally:
+            self._db.remove()
+        return len(pending)
@@ -1,15 +1,125 @@
 #!/usr/bin/env python3
 """
 The Flask application
+
+The application is built by `create_app`. The database schema is prepared
+once, in the process calling the factory, and every worker process lazily
+opens its own engine on its first request, so the app can be served by
+several pre-forked workers (e.g. `gunicorn -w 4 --preload
+"app:create_app()"`) without them sharing connections or wiping each
+other's data. Within a process each request thread gets its own database
+session, which is removed when the request ends. The schema is only
+dropped when DB_RESET is set.
+
+Unlike earlier versions, this module no longer builds a module-level `app`
+or `AUTH` at import time, since that opened the database before any
+worker was forked. Build the application with `create_app()`, e.g.
+`flask --app "app:create_app()" run`, or run `./app.py`.
 """
-from flask import Flask, request, jsonify, abort, redirect, url_for
 from auth import Auth
+from datetime import timedelta
+from directory import UserDirectory
+from flask import (Blueprint, Flask, abort, current_app, jsonify, redirect,
+                   request)
+from storage import get_db
+import os
+import threading
+
+views = Blueprint("views", __name__)
+_lock = threading.Lock()
+
+
+def _env_number(name: str, default: str) -> float:
+    """
+    Read a number of seconds from the environment
+    Args:
+        name (str): environment variable
+        default (str): value used when the variable is not set
+    Return:
+        the number
+    """
+    value = os.getenv(name, default)
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number of seconds, "
+                         f"got {value!r}") from None
+
 
-app = Flask(__name__)
-AUTH = Auth()
+def env_config() -> dict:
+    """
+    Read the default settings from the AUTH_* environment variables
+    Return:
+        dict of settings
+    """
+    return {
+        "DB_URL": os.getenv("AUTH_DB_URL", "sqlite:///a.db"),
+        "DB_RESET": os.getenv("AUTH_DB_RESET", "0") == "1",
+        "USER_DIRECTORY": os.getenv("AUTH_USER_DIRECTORY", "0") == "1",
+        "SESSION_TIMEOUT": _env_number("AUTH_SESSION_TIMEOUT", "0"),
+        "ACTIVITY_FLUSH_INTERVAL": _env_number(
+            "AUTH_ACTIVITY_FLUSH_INTERVAL", "5"),
+    }
 
 
-@app.route("/", methods=["GET"], strict_slashes=False)
+def create_app(config: dict = None) -> Flask:
+    """
+    Build a new Flask application
+    Args:
+        config (dict): settings overriding those of env_config, which is
+                       read when the application is built
+    Return:
+        Flask application
+    """
+    app = Flask(__name__)
+    app.config.update(env_config())
+    app.config.update(config or {})
+
+    # Prepare the schema before any worker is forked, then drop the
+    # connections so no child inherits them.
+    get_db(app.config["DB_URL"], reset=app.config["DB_RESET"]).close()
+
+    app.extensions["auth"] = {"pid": None, "auth": None, "db": None}
+    app.register_blueprint(views)
+    app.teardown_appcontext(remove_session)
+    return app
+
+
+def remove_session(exception: BaseException = None) -> None:
+    """
+    Release the database session of the request that just ended
+    Args:
+        exception (BaseException): error that ended the request, if any
+    """
+    state = current_app.extensions["auth"]
+    if state["pid"] == os.getpid():
+        state["db"].remove()
+
+
+def get_auth() -> Auth:
+    """
+    Get the Auth instance owned by the current process
+    Return:
+        Auth
+    """
+    state = current_app.extensions["auth"]
+    pid = os.getpid()
+    if state["pid"] != pid:
+        with _lock:
+            if state["pid"] != pid:
+                db = get_db(current_app.config["DB_URL"], reset=False)
+                if current_app.config["USER_DIRECTORY"]:
+                    db = UserDirectory(db)
+                timeout = current_app.config["SESSION_TIMEOUT"]
+                state["auth"] = Auth(
+                    db, timedelta(seconds=timeout) if timeout else None,
+                    current_app.config["ACTIVITY_FLUSH_INTERVAL"])
+                state["db"] = db
+                state["pid"] = pid
+    return state["auth"]
+
+
+@views.route("/", methods=["GET"], strict_slashes=False)
 def index() -> str:
     """
     Return a welcome message
@@ -17,7 +127,7 @@ def index() -> str:
     return jsonify({"message": "Bienvenue"})
 
 
-@app.route("/users", methods=["POST"], strict_slashes=False)
+@views.route("/users", methods=["POST"], strict_slashes=False)
 def users() -> str:
     """
     Register a new user
@@ -25,14 +135,14 @@ def users() -> str:
     email = request.form.get("email")
     password = request.form.get("password")
     try:
-        user = AUTH.register_user(email, password)
+        user = get_auth().register_user(email, password)
     except ValueError:
         return jsonify({"message": "email already registered"}), 400
 
     return jsonify({"email": f"{email}", "message": "user created"})
 
 
-@app.route("/sessions", methods=["POST"], strict_slashes=False)
+@views.route("/sessions", methods=["POST"], strict_slashes=False)
 def login() -> str:
     """
     Log in a user
@@ -40,55 +150,55 @@ def login() -> str:
     email = request.form.get("email")
     password = request.form.get("password")
 
-    if not AUTH.valid_login(email, password):
+    if not get_auth().valid_login(email, password):
         abort(401)
 
-    session_id = AUTH.create_session(email)
+    session_id = get_auth().create_session(email)
     resp = jsonify({"email": f"{email}", "message": "logged in"})
     resp.set_cookie("session_id", session_id)
     return resp
 
 
-@app.route("/sessions", methods=["DELETE"], strict_slashes=False)
+@views.route("/sessions", methods=["DELETE"], strict_slashes=False)
 def logout():
     """
     Log out a user
     """
     session_id = request.cookies.get("session_id", None)
-    user = AUTH.get_user_from_session_id(session_id)
+    user = get_auth().get_user_from_session_id(session_id)
     if user is None or session_id is None:
         abort(403)
-    AUTH.destroy_session(user.id)
+    get_auth().destroy_session(user.id)
     return redirect("/")
 
 
-@app.route("/profile", methods=["GET"], strict_slashes=False)
+@views.route("/profile", methods=["GET"], strict_slashes=False)
 def profile() -> str:
     """
     Get a user's profile
     """
     session_id = request.cookies.get("session_id")
-    user = AUTH.get_user_from_session_id(session_id)
+    user = get_auth().get_user_from_session_id(session_id)
     if user:
         return jsonify({"email": f"{user.email}"}), 200
     abort(403)
 
 
-@app.route("/reset_password", methods=["POST"], strict_slashes=False)
+@views.route("/reset_password", methods=["POST"], strict_slashes=False)
 def get_reset_password_token() -> str:
     """
     Get a reset password token
     """
     email = request.form.get("email")
     try:
-        reset_token = AUTH.get_reset_password_token(email)
+        reset_token = get_auth().get_reset_password_token(email)
     except ValueError:
         abort(403)
 
     return jsonify({"email": f"{email}", "reset_token": f"{reset_token}"})
 
 
-@app.route("/reset_password", methods=["PUT"], strict_slashes=False)
+@views.route("/reset_password", methods=["PUT"], strict_slashes=False)
 def update_password() -> str:
     """
     Umpdate a user's password
@@ -98,7 +208,7 @@ def update_password() -> str:
     new_password = request.form.get("new_password")
 
     try:
-        AUTH.update_password(reset_token, new_password)
+        get_auth().update_password(reset_token, new_password)
     except ValueError:
         abort(403)
 
@@ -106,4 +216,5 @@ def update_password() -> str:
 
 
 if __name__ == "__main__":
+    app = create_app({"DB_RESET": True})
     app.run(host="0.0.0.0", port="5000")
@@ -2,14 +2,19 @@
 """
 The auth module
 """
+from activity import ActivityBuffer
+from datetime import datetime, timedelta
 from db import DB
+from storage import Storage
 from sqlalchemy.orm.exc import NoResultFound
-from typing import TypeVar, Union
+from typing import Dict, Iterable, TypeVar, Union
 from user import User
 import bcrypt
+import secrets
 import uuid
 
 U = TypeVar(User)
+RESET_TOKEN_TTL = timedelta(hours=1)
 
 
 def _hash_password(password: str) -> bytes:
@@ -38,8 +43,25 @@ class Auth:
     The Auth class
     """
 
-    def __init__(self) -> None:
-        self._db = DB()
+    def __init__(self, db: Storage = None, session_timeout: timedelta = None,
+                 flush_interval: float = 5.0) -> None:
+        """
+        Initialize a new Auth instance
+        Args:
+            db (Storage): storage to use, a default DB is built when None
+            session_timeout (timedelta): idle time after which a session
+                                         expires, sessions never expire
+                                         when None
+            flush_interval (float): seconds between two writes of the
+                                    buffered session activity, only
+                                    used when sessions expire
+        """
+        self._db = db if db is not None else DB()
+        self._session_timeout = session_timeout
+        self._activity = None
+        if session_timeout is not None:
+            self._activity = ActivityBuffer(self._db, flush_interval,
+                                            session_timeout)
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -87,7 +109,10 @@ class Auth:
             return None
 
         session_id = _generate_uuid()
-        self._db.update_user(user.id, session_id=session_id)
+        if self._activity is not None:
+            self._activity.forget(user.id)
+        self._db.update_user(user.id, session_id=session_id,
+                             session_last_seen=datetime.utcnow())
         return session_id
 
     def get_user_from_session_id(self, session_id: str) -> Union[None, U]:
@@ -106,6 +131,14 @@ class Auth:
         except NoResultFound:
             return None
 
+        if self._activity is not None:
+            now = datetime.utcnow()
+            seen = [t for t in (self._activity.last_seen(user.id),
+                                user.session_last_seen) if t is not None]
+            if seen and now - max(seen) > self._session_timeout:
+                return None
+            self._activity.touch(user.id, now)
+
         return user
 
     def destroy_session(self, user_id: int) -> None:
@@ -114,8 +147,11 @@ class Auth:
         Args:
             user_id (int): user's id
         """
+        if self._activity is not None:
+            self._activity.forget(user_id)
         try:
-            self._db.update_user(user_id, session_id=None)
+            self._db.update_user(user_id, session_id=None,
+                                 session_last_seen=None)
         except ValueError:
             return None
         return None
@@ -134,9 +170,41 @@ class Auth:
             raise ValueError
 
         reset_token = _generate_uuid()
-        self._db.update_user(user.id, reset_token=reset_token)
+        self._db.update_user(user.id, reset_token=reset_token,
+                             reset_token_expires_at=datetime.utcnow() +
+                             RESET_TOKEN_TTL)
         return reset_token
 
+    def issue_reset_tokens(self, emails: Iterable[str],
+                           batch_size: int = 1000) -> Dict[str, str]:
+        """
+        Issue reset password tokens for many users at once
+        Args:
+            emails (Iterable[str]): users' email addresses
+            batch_size (int): number of users written per statement
+        Return:
+            reset token keyed by email, unknown emails are left out
+        """
+        emails = list(emails)
+        expires_at = datetime.utcnow() + RESET_TOKEN_TTL
+        tokens = {}
+        for i in range(0, len(emails), batch_size):
+            ids = self._db.find_user_ids(emails[i:i + batch_size])
+            batch = {email: secrets.token_urlsafe(32) for email in ids}
+            self._db.set_reset_tokens(
+                {ids[email]: token for email, token in batch.items()},
+                expires_at)
+            tokens.update(batch)
+        return tokens
+
+    def purge_reset_tokens(self) -> int:
+        """
+        Clear every expired reset password token
+        Return:
+            number of tokens cleared
+        """
+        return self._db.purge_reset_tokens()
+
     def update_password(self, reset_token: str, password: str) -> None:
         """
         Update a user's password
@@ -149,5 +217,10 @@ class Auth:
         except NoResultFound:
             raise ValueError()
 
+        expires_at = user.reset_token_expires_at
+        if expires_at is not None and expires_at < datetime.utcnow():
+            raise ValueError()
+
         hashed = _hash_password(password)
-        self._db.update_user(user.id, hashed_password=hashed, reset_token=None)
+        self._db.update_user(user.id, hashed_password=hashed, reset_token=None,
+                             reset_token_expires_at=None)
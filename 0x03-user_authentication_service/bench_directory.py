@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of the user directory
+
+Loads the same users as SQLAlchemy User objects and as UserRecord objects
+and prints the bytes held per user by each, plus the lookup time by email.
+"""
+from db import DB
+from directory import UserDirectory
+from user import ChangeSequence, User
+import sys
+import time
+import tracemalloc
+
+DB_URL = "sqlite:///bench_directory.db"
+
+
+def populate(db: DB, count: int) -> None:
+    """
+    Insert count users in a single transaction, stamped with change
+    sequence numbers 1 to count
+    Args:
+        db (DB): database to fill
+        count (int): number of users
+    """
+    db._session.add_all(
+        User(email=f"user{i}@example.com",
+             hashed_password=b"$2b$12$" + b"x" * 53,
+             session_id=f"{i:032x}", change_seq=i + 1)
+        for i in range(count))
+    # Advance the counter past the stamps set above, as add_user would
+    db._session.query(ChangeSequence).update({"value": count})
+    db._session.commit()
+
+
+def measure(build) -> tuple:
+    """
+    Measure the memory retained by the object a callable builds
+    Args:
+        build (callable): builds and returns the object to measure
+    Return:
+        the built object and the bytes it retains
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+
+def main(count: int) -> None:
+    """
+    Run the benchmark
+    Args:
+        count (int): number of users to load
+    """
+    db = DB(DB_URL)
+    populate(db, count)
+    db.close()
+
+    db = DB(DB_URL, reset=False)
+    users, orm_bytes = measure(lambda: db._session.query(User).all())
+    print(f"ORM User:   {orm_bytes / count:8.1f} bytes/user")
+    del users
+    db.close()
+
+    db = DB(DB_URL, reset=False)
+    directory, dir_bytes = measure(lambda: UserDirectory(db))
+    print(f"UserRecord: {dir_bytes / count:8.1f} bytes/user")
+
+    emails = [f"user{i}@example.com" for i in range(0, count, 7)]
+    start = time.perf_counter()
+    for email in emails:
+        directory.find_user_by(email=email)
+    elapsed = time.perf_counter() - start
+    print(f"directory lookup by email: "
+          f"{elapsed / len(emails) * 1e6:.2f} us/lookup")
+
+    user = db.add_user("late@example.com", "hashed")
+    directory.refresh()
+    assert directory.find_user_by(email="late@example.com").id == user.id
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
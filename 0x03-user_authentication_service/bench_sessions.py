@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of session expiry
+
+Serves /profile requests, spread over many sessions, with session expiry
+disabled and enabled. Each round runs for a fixed time, several times the
+production flush interval of 5 seconds, so the write-behind flushes happen
+while requests are measured. The two modes alternate for several rounds,
+in both orders to cancel out drift, and the median and spread of the
+requests per second of each are printed, along with the time the flushes
+took. Both lookup paths are run: the database, which reads the users
+table on every request, and the in-memory user directory, whose much
+cheaper lookups leave the expiry check as a larger share of each request.
+
+The cost the expiry check adds to every request is then timed on its own,
+by calling Auth.get_user_from_session_id without the HTTP layer, since it
+is smaller than the round to round spread of the request rates.
+"""
+from app import create_app
+from auth import Auth
+from datetime import timedelta
+from directory import UserDirectory
+from statistics import median
+from storage import get_db
+import gc
+import sys
+import time
+
+DB_URL = "sqlite:///bench_sessions.db"
+SESSIONS = 1000
+FLUSH_INTERVAL = 5.0
+ROUND_SECONDS = 12.0
+ROUNDS = 5
+LOOKUPS = 200000
+
+
+def populate(db) -> None:
+    """
+    Add one user with an open session per benchmarked session
+    Args:
+        db (Storage): storage to fill
+    """
+    for i in range(SESSIONS):
+        user = db.add_user(f"bench{i}@example.com", "hashed")
+        db.update_user(user.id, session_id=f"session{i}")
+
+
+def run(session_timeout: int, seconds: float, directory: bool) -> tuple:
+    """
+    Serve /profile requests against a fresh application for a fixed time
+    Args:
+        session_timeout (int): idle timeout in seconds, 0 disables expiry
+        seconds (float): duration of the round
+        directory (bool): whether users are looked up in the directory
+    Return:
+        requests per second, number of flushes, and seconds spent flushing
+    """
+    app = create_app({"DB_URL": DB_URL, "DB_RESET": True,
+                      "USER_DIRECTORY": directory,
+                      "SESSION_TIMEOUT": session_timeout,
+                      "ACTIVITY_FLUSH_INTERVAL": FLUSH_INTERVAL})
+    db = get_db(DB_URL, reset=False)
+    populate(db)
+    db.close()
+
+    gc.collect()
+    client = app.test_client(use_cookies=False)
+    cookies = [{"Cookie": f"session_id=session{i}"} for i in range(SESSIONS)]
+    client.get("/profile", headers=cookies[0])
+    activity = app.extensions["auth"]["auth"]._activity
+    flushes = []
+    if activity is not None:
+        flush = activity.flush
+
+        def timed_flush() -> int:
+            """
+            Flush the buffer, recording how long it took
+            """
+            start = time.perf_counter()
+            try:
+                return flush()
+            finally:
+                flushes.append(time.perf_counter() - start)
+        activity.flush = timed_flush
+
+    count = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        assert client.get("/profile",
+                          headers=cookies[count % SESSIONS]
+                          ).status_code == 200
+        count += 1
+    rate = count / (time.perf_counter() - start)
+    if activity is not None:
+        activity.flush = flush
+        activity.stop()
+    return rate, len(flushes), sum(flushes)
+
+
+def summary(rates: list) -> str:
+    """
+    Format the median and spread of a list of rates
+    Args:
+        rates (list): requests per second of each round
+    Return:
+        the formatted summary
+    """
+    return (f"median {median(rates):8,.0f} req/s "
+            f"(min {min(rates):,.0f}, max {max(rates):,.0f})")
+
+
+def compare(seconds: float, directory: bool) -> None:
+    """
+    Alternate rounds without and with expiry and print the comparison
+    Args:
+        seconds (float): duration of each round
+        directory (bool): whether users are looked up in the directory
+    """
+    base, expiry, flushes, flushing = [], [], [], []
+    for i in range(ROUNDS):
+        for timeout in ((0, 3600) if i % 2 == 0 else (3600, 0)):
+            rate, count, spent = run(timeout, seconds, directory)
+            if timeout:
+                expiry.append(rate)
+                flushes.append(count)
+                flushing.append(spent)
+            else:
+                base.append(rate)
+    print(f"{'user directory' if directory else 'database'} lookups:")
+    print(f"  no expiry:   {summary(base)}")
+    print(f"  with expiry: {summary(expiry)}")
+    change = (median(expiry) - median(base)) / median(base)
+    print(f"  median change: {change:+.1%}")
+    print(f"  flushes per round: {min(flushes)}-{max(flushes)}, "
+          f"time spent flushing: {median(flushing) / seconds:.2%} "
+          f"of each round (median)")
+
+
+def lookup_cost() -> None:
+    """
+    Time session lookups on a user directory without and with expiry
+    """
+    db = get_db(DB_URL, reset=True)
+    populate(db)
+    directory = UserDirectory(db)
+    session_ids = [f"session{i % SESSIONS}" for i in range(LOOKUPS)]
+    times = {None: [], timedelta(hours=1): []}
+    for _ in range(ROUNDS):
+        for timeout in times:
+            auth = Auth(directory, timeout, FLUSH_INTERVAL)
+            gc.collect()
+            start = time.perf_counter()
+            for session_id in session_ids:
+                auth.get_user_from_session_id(session_id)
+            times[timeout].append(
+                (time.perf_counter() - start) / LOOKUPS * 1e6)
+            if auth._activity is not None:
+                auth._activity.stop()
+    directory.close()
+    base, expiry = (median(rounds) for rounds in times.values())
+    print(f"session lookup: {base:.2f} us without expiry, "
+          f"{expiry:.2f} us with expiry (+{expiry - base:.2f} us)")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else ROUND_SECONDS
+    print(f"{SESSIONS} sessions, {ROUNDS} rounds of {seconds:g}s, "
+          f"flush every {FLUSH_INTERVAL:g}s")
+    compare(seconds, False)
+    compare(seconds, True)
+    lookup_cost()
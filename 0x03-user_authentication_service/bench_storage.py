@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Comparative benchmark of the storage backends
+
+Times add_user, find_user_by and update_user on each backend and prints
+the operations per second of each.
+"""
+from storage import get_db
+import sys
+import time
+
+URLS = ("memory://", "sqlite:///bench_storage.db", "sqlite:///:memory:")
+
+
+def rate(count: int, func) -> float:
+    """
+    Time count calls of a function
+    Args:
+        count (int): number of calls
+        func (callable): function called with the call index
+    Return:
+        calls per second
+    """
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return count / (time.perf_counter() - start)
+
+
+def run(url: str, count: int) -> None:
+    """
+    Benchmark one backend and print its results
+    Args:
+        url (str): database URL given to get_db
+        count (int): number of users
+    """
+    start = time.perf_counter()
+    db = get_db(url, reset=True)
+    setup = time.perf_counter() - start
+    add = rate(count, lambda i: db.add_user(f"user{i}@example.com",
+                                            "hashed"))
+    ids = [db.find_user_by(email=f"user{i}@example.com").id
+           for i in range(count)]
+    find = rate(count, lambda i: db.find_user_by(
+        email=f"user{i}@example.com"))
+    update = rate(count, lambda i: db.update_user(ids[i],
+                                                  session_id=f"s{i}"))
+    db.close()
+    print(f"{url:<28} {setup * 1000:>9.1f} {add:>10,.0f} {find:>10,.0f} "
+          f"{update:>10,.0f}")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    urls = sys.argv[2:] or URLS
+    print(f"{'backend':<28} {'setup ms':>9} {'add/s':>10} {'find/s':>10} "
+          f"{'update/s':>10}")
+    for url in urls:
+        run(url, count)
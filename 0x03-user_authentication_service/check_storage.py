@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Conformance checks shared by every storage backend
+
+Run with no argument to check all backends, or pass database URLs:
+    ./check_storage.py memory:// sqlite:///check.db
+Every URL is checked on its own and behind a UserDirectory.
+"""
+from datetime import datetime, timedelta
+from directory import UserDirectory
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.exc import InvalidRequestError
+from storage import Storage, get_db
+import sys
+import threading
+
+URLS = ("memory://", "sqlite:///check_storage.db",
+        "sqlite:///:memory:")
+
+
+def check_add_and_find(db: Storage) -> None:
+    """
+    Check that added users can be found by id, email and other columns,
+    and that an email cannot be added twice.
+    Args:
+        db: The storage under test.
+    """
+    user = db.add_user("test@test.com", "SuperHashedPwd")
+    assert (user.id is not None)
+    assert (user.email == "test@test.com")
+    assert (user.hashed_password == "SuperHashedPwd")
+    assert (db.find_user_by(id=user.id).email == "test@test.com")
+    assert (db.find_user_by(email="test@test.com").id == user.id)
+    assert (db.find_user_by(hashed_password="SuperHashedPwd").id == user.id)
+    try:
+        db.add_user("test@test.com", "OtherPwd")
+        assert (False)
+    except ValueError:
+        pass
+    other = db.add_user("test1@test.com", "SuperHashedPwd1")
+    assert (other.id != user.id)
+    assert (db.find_user_by(email="test1@test.com").id == other.id)
+
+
+def check_find_errors(db: Storage) -> None:
+    """
+    Check the errors raised by find_user_by.
+    Args:
+        db: The storage under test.
+    """
+    try:
+        db.find_user_by(email="nobody@test.com")
+        assert (False)
+    except NoResultFound:
+        pass
+    try:
+        db.find_user_by(no_email="test@test.com")
+        assert (False)
+    except InvalidRequestError:
+        pass
+
+
+def check_update(db: Storage) -> None:
+    """
+    Check update_user and the errors it raises.
+    Args:
+        db: The storage under test.
+    """
+    user = db.find_user_by(email="test@test.com")
+    db.update_user(user.id, session_id="abc", hashed_password="NewPwd")
+    found = db.find_user_by(session_id="abc")
+    assert (found.id == user.id)
+    assert (found.hashed_password == "NewPwd")
+    db.update_user(user.id, session_id=None)
+    try:
+        db.find_user_by(session_id="abc")
+        assert (False)
+    except NoResultFound:
+        pass
+    for user_id, kwargs in ((user.id, {"no_column": 1}),
+                            (10 ** 6, {"session_id": "x"})):
+        try:
+            db.update_user(user_id, **kwargs)
+            assert (False)
+        except ValueError:
+            pass
+
+
+def check_bulk(db: Storage) -> None:
+    """
+    Check the batched reset token and last-seen writes.
+    Args:
+        db: The storage under test.
+    """
+    emails = {"test@test.com", "test1@test.com", "nobody@test.com"}
+    ids = db.find_user_ids(emails)
+    assert (set(ids) == {"test@test.com", "test1@test.com"})
+    assert (ids["test@test.com"] == db.find_user_by(email="test@test.com").id)
+    past = datetime.utcnow() - timedelta(minutes=1)
+    db.set_reset_tokens({user_id: f"token-{email}"
+                         for email, user_id in ids.items()}, past)
+    user = db.find_user_by(reset_token="token-test@test.com")
+    assert (user.email == "test@test.com")
+    assert (db.purge_reset_tokens() == 2)
+    try:
+        db.find_user_by(reset_token="token-test@test.com")
+        assert (False)
+    except NoResultFound:
+        pass
+    db.set_last_seen({user.id: past})
+    assert (db.find_user_by(id=user.id).session_last_seen == past)
+
+
+def check_changes(db: Storage) -> None:
+    """
+    Check that find_changes reports writes in sequence order.
+    Args:
+        db: The storage under test.
+    """
+    rows = db.find_changes(0)
+    assert ({row["email"] for row in rows} ==
+            {"test@test.com", "test1@test.com"})
+    last = rows[-1]["change_seq"]
+    assert (db.find_changes(last) == [])
+    user = db.find_user_by(email="test1@test.com")
+    db.update_user(user.id, session_id="xyz")
+    rows = db.find_changes(last)
+    assert ([row["session_id"] for row in rows] == ["xyz"])
+
+
+def check_threads(db: Storage) -> None:
+    """
+    Check that users written from another thread are seen by this one,
+    and the other way round.
+    Args:
+        db: The storage under test.
+    """
+    found = {}
+
+    def worker() -> None:
+        """
+        Find a user written by the main thread, then add one
+        """
+        try:
+            found["main"] = db.find_user_by(email="test@test.com").id
+            found["thread"] = db.add_user("thread@test.com", "Pwd").id
+        finally:
+            db.remove()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert (found["main"] == db.find_user_by(email="test@test.com").id)
+    assert (db.find_user_by(email="thread@test.com").id == found["thread"])
+
+
+CHECKS = (check_add_and_find, check_find_errors, check_update, check_bulk,
+          check_changes, check_threads)
+
+
+if __name__ == "__main__":
+    for url in sys.argv[1:] or URLS:
+        for wrap in (None, UserDirectory):
+            db = get_db(url, reset=True)
+            if wrap is not None:
+                db = wrap(db)
+            for check in CHECKS:
+                check(db)
+            db.close()
+            print(f"{url}{' (directory)' if wrap else ''}: "
+                  f"{len(CHECKS)} checks passed")
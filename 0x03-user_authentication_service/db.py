@@ -2,38 +2,129 @@
 """
 The db module
 """
-from sqlalchemy import create_engine
+from datetime import datetime
+from sqlalchemy import bindparam, create_engine, event, func, inspect
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import InvalidRequestError
-from user import Base, User
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from storage import Storage
+from typing import Dict, Iterable, List
+from user import Base, ChangeSequence, User
 
 
-class DB:
+class DB(Storage):
     """The db class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, url: str = "sqlite:///a.db",
+                 reset: bool = True) -> None:
         """
         Initialize a new DB instance
+        Args:
+            url (str): SQLAlchemy database URL
+            reset (bool): drop and recreate the schema when True, only
+                          create missing tables otherwise
         """
-        self._engine = create_engine("sqlite:///a.db",
-                                     echo=False)
-        Base.metadata.drop_all(self._engine)
+        self._engine = self._create_engine(url)
+        if reset:
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        self._check_schema()
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
+        self._init_seq()
+
+    def _check_schema(self) -> None:
+        """
+        Check that every table has all the columns and indexes of its
+        model, since create_all does not add them to tables that already
+        exist
+        Raise:
+            RuntimeError: when a column or an index is missing
+        """
+        inspector = inspect(self._engine)
+        for table in Base.metadata.sorted_tables:
+            found = {col["name"] for col in inspector.get_columns(table.name)}
+            missing = [col.name for col in table.columns
+                       if col.name not in found]
+            indexes = {idx["name"]
+                       for idx in inspector.get_indexes(table.name)}
+            missing += [idx.name for idx in table.indexes
+                        if idx.name not in indexes]
+            if missing:
+                raise RuntimeError(
+                    f"Table {table.name} is missing columns or indexes "
+                    f"{', '.join(missing)}: its schema predates this "
+                    f"version. Start once with AUTH_DB_RESET=1 to recreate "
+                    f"it (this deletes its data).")
+
+    def _create_engine(self, url: str) -> Engine:
+        """
+        Create the engine the database is reached through. An in-memory
+        SQLite database lives in a single connection, which every thread
+        shares so they all see the same tables
+        Args:
+            url (str): SQLAlchemy database URL
+        Return:
+            Engine
+        """
+        parsed = make_url(url)
+        if parsed.get_backend_name() == "sqlite" and \
+                parsed.database in (None, "", ":memory:"):
+            return create_engine(url, echo=False, poolclass=StaticPool,
+                                 connect_args={"check_same_thread": False})
+        return create_engine(url, echo=False)
+
+    def close(self) -> None:
+        """
+        Close the session and release every pooled connection
+        """
+        self.__session.remove()
+        self._engine.dispose()
+
+    def remove(self) -> None:
+        """
+        Roll back and close the session of the calling thread
+        """
+        self.__session.remove()
 
     @property
     def _session(self) -> Session:
         """
-        Get the database session
+        Get the database session of the calling thread
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        return self.__session()
+
+    def _init_seq(self) -> None:
+        """
+        Create the change sequence row if the database has none yet
+        """
+        if self._session.query(ChangeSequence).filter_by(id=1).first():
+            return
+        last = self._session.query(func.max(User.change_seq)).scalar()
+        self._session.add(ChangeSequence(id=1, value=last or 0))
+        try:
+            self._session.commit()
+        except IntegrityError:
+            # Another process created it first
+            self._session.rollback()
+
+    def _next_seq(self) -> int:
+        """
+        Allocate the change sequence number to stamp the next write with.
+        The counter row stays locked until the caller commits, so writers
+        get distinct numbers and commit in sequence order.
+        Return:
+            the allocated sequence number
+        """
+        seq = ChangeSequence.__table__
+        self._session.execute(seq.update().where(seq.c.id == 1).values(
+            value=seq.c.value + 1))
+        return self._session.query(ChangeSequence.value).filter(
+            ChangeSequence.id == 1).scalar()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """
@@ -44,9 +135,14 @@ class DB:
         Return:
             User
         """
-        user = User(email=email, hashed_password=hashed_password)
+        user = User(email=email, hashed_password=hashed_password,
+                    change_seq=self._next_seq())
         self._session.add(user)
-        self._session.commit()
+        try:
+            self._session.commit()
+        except IntegrityError:
+            self._session.rollback()
+            raise ValueError(f"User {email} already exists")
         return user
 
     def find_user_by(self, **kwargs) -> User:
@@ -86,4 +182,119 @@ class DB:
                 setattr(usr, key, value)
             else:
                 raise ValueError
+        usr.change_seq = self._next_seq()
+        self._session.commit()
+
+    def find_user_ids(self, emails: Iterable[str]) -> Dict[str, int]:
+        """
+        Find the ids of the users owning the given emails, using the
+        email index
+        Args:
+            emails (Iterable[str]): emails to look up
+        Return:
+            user id keyed by email, unknown emails are left out
+        """
+        rows = self._session.query(User.email, User.id).filter(
+            User.email.in_(list(emails)))
+        return dict(rows)
+
+    def set_reset_tokens(self, tokens: Dict[int, str],
+                         expires_at: datetime) -> None:
+        """
+        Set the reset tokens of many users with a single statement, each
+        row being found by primary key
+        Args:
+            tokens (dict): reset token keyed by user id
+            expires_at (datetime): expiry of every token in the batch
+        """
+        if not tokens:
+            return
+        users = User.__table__
+        stmt = users.update().where(
+            users.c.id == bindparam("_id")).values(
+            reset_token=bindparam("_token"),
+            reset_token_expires_at=bindparam("_expires_at"),
+            change_seq=self._next_seq())
+        self._session.execute(stmt, [
+            {"_id": user_id, "_token": token, "_expires_at": expires_at}
+            for user_id, token in tokens.items()])
+        self._session.commit()
+
+    def purge_reset_tokens(self, now: datetime = None) -> int:
+        """
+        Clear every reset token that expired before now
+        Args:
+            now (datetime): reference time, defaults to the current UTC time
+        Return:
+            number of tokens cleared
+        """
+        if now is None:
+            now = datetime.utcnow()
+        users = User.__table__
+        stmt = users.update().where(
+            users.c.reset_token_expires_at < now).values(
+            reset_token=None, reset_token_expires_at=None,
+            change_seq=self._next_seq())
+        result = self._session.execute(stmt)
         self._session.commit()
+        return result.rowcount
+
+    def find_changes(self, since: int) -> List[dict]:
+        """
+        Find the users written after a change sequence number
+        Args:
+            since (int): last change sequence number already seen
+        Return:
+            list of user column values ordered by change sequence
+        """
+        users = User.__table__
+        stmt = users.select().where(
+            users.c.change_seq > since).order_by(users.c.change_seq)
+        return [dict(row._mapping) for row in self._session.execute(stmt)]
+
+    def set_last_seen(self, times: Dict[int, datetime]) -> None:
+        """
+        Set the session last-seen time of many users with one statement
+        Args:
+            times (dict): last-seen time keyed by user id
+        """
+        if not times:
+            return
+        users = User.__table__
+        stmt = users.update().where(
+            users.c.id == bindparam("_id")).values(
+            session_last_seen=bindparam("_last_seen"),
+            change_seq=self._next_seq())
+        self._session.execute(stmt, [
+            {"_id": user_id, "_last_seen": when}
+            for user_id, when in times.items()])
+        self._session.commit()
+
+
+class SQLiteDB(DB):
+    """
+    DB over a SQLite file in write-ahead logging mode, so readers in other
+    processes are not blocked while a worker writes
+    """
+
+    def _create_engine(self, url: str) -> Engine:
+        """
+        Create an engine whose connections use WAL journaling
+        Args:
+            url (str): sqlite:/// database URL
+        Return:
+            Engine
+        """
+        engine = create_engine(url, echo=False)
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record) -> None:
+            """
+            Switch each new connection to WAL journaling
+            """
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+        return engine
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+The directory module
+
+A compact, in-memory copy of the users table for nodes that mostly
+authenticate. Users are held as slotted records with hash indexes on id,
+email and session id, and are refreshed incrementally from the database
+using each row's change sequence number.
+"""
+from datetime import datetime
+from storage import Storage
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.exc import InvalidRequestError
+from typing import Dict, Iterable, List, Optional
+from user import User
+import threading
+import time
+
+FIELDS = ("id", "email", "hashed_password", "session_id",
+          "session_last_seen", "reset_token", "reset_token_expires_at",
+          "change_seq")
+
+
+class UserRecord:
+    """
+    A read-only snapshot of one user row
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, row: dict) -> None:
+        """
+        Initialize a record from a users row
+        Args:
+            row (dict): user column values, as given by find_changes
+        """
+        for key in FIELDS:
+            object.__setattr__(self, key, row[key])
+
+    def __setattr__(self, key: str, value) -> None:
+        """
+        Refuse to modify a record, writes must go through the database
+        """
+        raise AttributeError("UserRecord is read-only")
+
+
+class UserDirectory(Storage):
+    """
+    In-memory user directory in front of another storage. Lookups are
+    served from memory, writes go to the mirrored storage and are pulled
+    back in. A lookup that misses pulls new changes before giving up, so
+    rows written by other processes are seen right away.
+    """
+
+    def __init__(self, db: Storage, refresh_interval: float = 1.0) -> None:
+        """
+        Initialize the directory and load every user
+        Args:
+            db (Storage): storage the directory mirrors
+            refresh_interval (float): seconds a lookup may serve without
+                                      pulling new changes
+        """
+        self._db = db
+        self._refresh_interval = refresh_interval
+        self._seq = 0
+        self._refreshed_at = 0.0
+        self._by_id: Dict[int, UserRecord] = {}
+        self._by_email: Dict[str, UserRecord] = {}
+        self._by_session: Dict[str, UserRecord] = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __len__(self) -> int:
+        """
+        Get the number of users held in the directory
+        """
+        return len(self._by_id)
+
+    def refresh(self) -> int:
+        """
+        Pull the users written since the last refresh
+        Return:
+            number of records loaded
+        """
+        with self._lock:
+            rows = self._db.find_changes(self._seq)
+            for row in rows:
+                self._store(UserRecord(row))
+            if rows:
+                self._seq = rows[-1]["change_seq"]
+            self._refreshed_at = time.monotonic()
+        return len(rows)
+
+    def _store(self, record: UserRecord) -> None:
+        """
+        Replace a user's record and keep the indexes in step
+        Args:
+            record (UserRecord): new record of the user
+        """
+        old = self._by_id.get(record.id)
+        if old is not None:
+            self._by_email.pop(old.email, None)
+            if old.session_id is not None:
+                self._by_session.pop(old.session_id, None)
+        self._by_id[record.id] = record
+        self._by_email[record.email] = record
+        if record.session_id is not None:
+            self._by_session[record.session_id] = record
+
+    def _lookup(self, key: str, value) -> Optional[UserRecord]:
+        """
+        Find one record by a single attribute
+        Args:
+            key (str): attribute name
+            value: attribute value
+        Return:
+            UserRecord or None
+        """
+        if key == "id":
+            return self._by_id.get(value)
+        if key == "email":
+            return self._by_email.get(value)
+        if key == "session_id" and value is not None:
+            return self._by_session.get(value)
+        for record in self._by_id.values():
+            if getattr(record, key) == value:
+                return record
+        return None
+
+    def _match(self, kwargs: dict) -> Optional[UserRecord]:
+        """
+        Find the record matching every attribute given
+        Args:
+            kwargs (dict): attributes to match, the first one is looked up
+        Return:
+            UserRecord or None
+        """
+        key, value = next(iter(kwargs.items()))
+        record = self._lookup(key, value)
+        if record is not None and all(
+                getattr(record, k) == v for k, v in kwargs.items()):
+            return record
+        return None
+
+    def find_user_by(self, **kwargs) -> UserRecord:
+        """
+        Find a user in the directory
+        Args:
+            kwargs (dict): dict of key, value pairs representing the
+                           attributes to search by
+        Return:
+            UserRecord
+        """
+        for key in kwargs:
+            if key not in User.__dict__:
+                raise InvalidRequestError
+        if not kwargs:
+            raise NoResultFound
+        refreshed = False
+        if time.monotonic() - self._refreshed_at >= self._refresh_interval:
+            self.refresh()
+            refreshed = True
+        record = self._match(kwargs)
+        if record is None and not refreshed:
+            # Another process may have just written the row we look for
+            self.refresh()
+            record = self._match(kwargs)
+        if record is None:
+            raise NoResultFound
+        return record
+
+    def add_user(self, email: str, hashed_password: str) -> UserRecord:
+        """
+        Add a user to the database and the directory
+        Args:
+            email (str): user's email
+            hashed_password (str): user's hashed password
+        Return:
+            UserRecord
+        """
+        user = self._db.add_user(email, hashed_password)
+        self.refresh()
+        return self._by_id[user.id]
+
+    def update_user(self, user_id: int, **kwargs) -> None:
+        """
+        Update a user in the database and the directory
+        Args:
+            user_id (int): user's id
+            kwargs (dict): dict of key, value pairs representing the
+                           attributes to update
+        """
+        self._db.update_user(user_id, **kwargs)
+        self.refresh()
+
+    def set_reset_tokens(self, tokens: Dict[int, str],
+                         expires_at: datetime) -> None:
+        """
+        Set the reset tokens of many users in the database and the directory
+        Args:
+            tokens (dict): reset token keyed by user id
+            expires_at (datetime): expiry of every token in the batch
+        """
+        self._db.set_reset_tokens(tokens, expires_at)
+        self.refresh()
+
+    def purge_reset_tokens(self, now: datetime = None) -> int:
+        """
+        Clear every expired reset token in the database and the directory
+        Args:
+            now (datetime): reference time, defaults to the current UTC time
+        Return:
+            number of tokens cleared
+        """
+        count = self._db.purge_reset_tokens(now)
+        self.refresh()
+        return count
+
+    def set_last_seen(self, times: Dict[int, datetime]) -> None:
+        """
+        Set the session last-seen time of many users in the database and
+        the directory
+        Args:
+            times (dict): last-seen time keyed by user id
+        """
+        self._db.set_last_seen(times)
+        self.refresh()
+
+    def find_user_ids(self, emails: Iterable[str]) -> Dict[str, int]:
+        """
+        Find the ids of the users owning the given emails in the database
+        Args:
+            emails (Iterable[str]): emails to look up
+        Return:
+            user id keyed by email, unknown emails are left out
+        """
+        return self._db.find_user_ids(emails)
+
+    def find_changes(self, since: int) -> List[dict]:
+        """
+        Find the users written after a change sequence number in the
+        database
+        Args:
+            since (int): last change sequence number already seen
+        Return:
+            list of user column dicts, in change sequence order
+        """
+        return self._db.find_changes(since)
+
+    def remove(self) -> None:
+        """
+        Release the database session of the calling thread
+        """
+        self._db.remove()
+
+    def close(self) -> None:
+        """
+        Release every database resource
+        """
+        self._db.close()
@@ -1,18 +1,112 @@
 #!/usr/bin/env python3
 """
 THis is the main file
+
+The checks are coroutines that send their requests through the client and
+base URL set by use_client for the calling task, or through requests to
+BASE_URL by default, so the same checks can be run concurrently by
+scenario_runner.py.
 """
+from contextvars import ContextVar
+from typing import Callable, Dict
+import asyncio
+import json
+import os
 import requests
 
+BASE_URL = os.getenv("AUTH_BASE_URL", "http://127.0.0.1:5000")
+
 
-def register_user(email: str, password: str) -> None:
+class Response:
+    """
+    The parts of a response the checks look at.
+    """
+
+    def __init__(self, status_code: int, text: str,
+                 cookies: Dict[str, str], url: str) -> None:
+        """
+        Initialize a response.
+        Args:
+            status_code: The HTTP status code.
+            text: The body of the response.
+            cookies: The cookies set by the response.
+            url: The URL of the response, after redirects.
+        """
+        self.status_code = status_code
+        self.text = text
+        self.cookies = cookies
+        self.url = url
+
+    def json(self):
+        """
+        Decode the body of the response as JSON.
+        """
+        return json.loads(self.text)
+
+
+class RequestsClient:
+    """
+    Client sending each request of the checks on its own with the
+    requests library.
+    """
+
+    async def request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        Send a request, blocking the event loop until it is answered.
+        Args:
+            method: The HTTP method.
+            url: The URL of the request.
+            kwargs: The arguments of requests.request, e.g. data, cookies.
+        """
+        r = requests.request(method, url, **kwargs)
+        return Response(r.status_code, r.text, r.cookies.get_dict(), r.url)
+
+
+_client = ContextVar("client", default=RequestsClient())
+_base_url = ContextVar("base_url", default=BASE_URL)
+
+
+def use_client(client, base_url: str = BASE_URL) -> None:
+    """
+    Make the checks run by the calling task, and the tasks it then starts,
+    use a client and base URL.
+    Args:
+        client: The client the requests are sent through, with the request
+                coroutine of RequestsClient.
+        base_url: The URL of the service, without trailing slash.
+    """
+    _client.set(client)
+    _base_url.set(base_url)
+
+
+def _url(path: str) -> str:
+    """
+    Build the URL of a path on the service.
+    Args:
+        path: The path, starting with a slash.
+    """
+    return _base_url.get() + path
+
+
+async def _request(method: str, path: str, **kwargs) -> Response:
+    """
+    Send a request to the service through the client of the calling task.
+    Args:
+        method: The HTTP method.
+        path: The path, starting with a slash.
+        kwargs: The data or cookies of the request.
+    """
+    return await _client.get().request(method, _url(path), **kwargs)
+
+
+async def register_user(email: str, password: str) -> None:
     """
     Test for registering a user.
     Args:
         email: The email of the user.
     """
-    resp = requests.post('http://127.0.0.1:5000/users',
-                         data={'email': email, 'password': password})
+    resp = await _request('POST', '/users',
+                          data={'email': email, 'password': password})
     if resp.status_code == 200:
         assert (resp.json() == {"email": email, "message": "user created"})
     else:
@@ -20,79 +114,76 @@ def register_user(email: str, password: str) -> None:
         assert (resp.json() == {"message": "email already registered"})
 
 
-def log_in_wrong_password(email: str, password: str) -> None:
+async def log_in_wrong_password(email: str, password: str) -> None:
     """
     Test for log in with the given wrong password.
     Args:
         email: The email of the user.
         password: The password of the user.
     """
-    r = requests.post('http://127.0.0.1:5000/sessions',
-                      data={'email': email, 'password': password})
+    r = await _request('POST', '/sessions',
+                       data={'email': email, 'password': password})
     assert (r.status_code == 401)
 
 
-def profile_unlogged() -> None:
+async def profile_unlogged() -> None:
     """
     Test for profile with not being logged in.
     """
-    r = requests.get('http://127.0.0.1:5000/profile')
+    r = await _request('GET', '/profile')
     assert (r.status_code == 403)
 
 
-def log_in(email: str, password: str) -> str:
+async def log_in(email: str, password: str) -> str:
     """
     Test for log in with the given email and password.
     Args:
         email: The email of the user.
         password: The password of the user.
     """
-    resp = requests.post('http://127.0.0.1:5000/sessions',
-                         data={'email': email, 'password': password})
+    resp = await _request('POST', '/sessions',
+                          data={'email': email, 'password': password})
     assert (resp.status_code == 200)
     assert (resp.json() == {"email": email, "message": "logged in"})
     return resp.cookies['session_id']
 
 
-def profile_logged(session_id: str) -> None:
+async def profile_logged(session_id: str) -> None:
     """
     Test for profile with the given session_id.
     Args: session_id: The session_id of the user.
     """
     cookies = {'session_id': session_id}
-    r = requests.get('http://127.0.0.1:5000/profile',
-                     cookies=cookies)
+    r = await _request('GET', '/profile', cookies=cookies)
     assert (r.status_code == 200)
 
 
-def log_out(session_id: str) -> None:
+async def log_out(session_id: str) -> None:
     """
     Test for log out with the given session_id.
     Args: session_id: The session_id of the user.
     """
     cookies = {'session_id': session_id}
-    r = requests.delete('http://127.0.0.1:5000/sessions',
-                        cookies=cookies)
+    r = await _request('DELETE', '/sessions', cookies=cookies)
     if r.status_code == 302:
-        assert (r.url == 'http://127.0.0.1:5000/')
+        assert (r.url == _url('/'))
     else:
         assert (r.status_code == 200)
 
 
-def reset_password_token(email: str) -> str:
+async def reset_password_token(email: str) -> str:
     """
     Test for reset password token with the given email.
     Args: email: The email of the user.
     """
-    r = requests.post('http://127.0.0.1:5000/reset_password',
-                      data={'email': email})
+    r = await _request('POST', '/reset_password', data={'email': email})
     if r.status_code == 200:
         return r.json()['reset_token']
     assert (r.status_code == 401)
 
 
-def update_password(email: str, reset_token: str,
-                    new_password: str) -> None:
+async def update_password(email: str, reset_token: str,
+                          new_password: str) -> None:
     """
     Test for update password with the given email, reset_token and
     new_password.
@@ -103,8 +194,7 @@ def update_password(email: str, reset_token: str,
     """
     data = {'email': email, 'reset_token': reset_token,
             'new_password': new_password}
-    r = requests.put('http://127.0.0.1:5000/reset_password',
-                     data=data)
+    r = await _request('PUT', '/reset_password', data=data)
     if r.status_code == 200:
         assert (r.json() == {"email": email, "message": "Password updated"})
     else:
@@ -116,14 +206,37 @@ PASSWD = "b4l0u"
 NEW_PASSWD = "t4rt1fl3tt3"
 
 
-if __name__ == "__main__":
+async def _call(name: str, check: Callable, *args):
+    """
+    Run a check.
+    Args:
+        name: The name of the step.
+        check: The check to run.
+        args: The arguments of the check.
+    """
+    return await check(*args)
+
+
+async def run_scenario(email: str, step: Callable = _call) -> None:
+    """
+    Run every check in order for one user.
+    Args:
+        email: The email of the user.
+        step: Awaited as step(name, check, *args) to run each check.
+    """
+    await step("register_user", register_user, email, PASSWD)
+    await step("log_in_wrong_password", log_in_wrong_password, email,
+               NEW_PASSWD)
+    await step("profile_unlogged", profile_unlogged)
+    session_id = await step("log_in", log_in, email, PASSWD)
+    await step("profile_logged", profile_logged, session_id)
+    await step("log_out", log_out, session_id)
+    reset_token = await step("reset_password_token", reset_password_token,
+                             email)
+    await step("update_password", update_password, email, reset_token,
+               NEW_PASSWD)
+    await step("log_in_new_password", log_in, email, NEW_PASSWD)
 
-    register_user(EMAIL, PASSWD)
-    log_in_wrong_password(EMAIL, NEW_PASSWD)
-    profile_unlogged()
-    session_id = log_in(EMAIL, PASSWD)
-    profile_logged(session_id)
-    log_out(session_id)
-    reset_token = reset_password_token(EMAIL)
-    update_password(EMAIL, reset_token, NEW_PASSWD)
-    log_in(EMAIL, NEW_PASSWD)
+
+if __name__ == "__main__":
+    asyncio.run(run_scenario(EMAIL))
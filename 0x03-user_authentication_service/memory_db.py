@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+The memory_db module
+"""
+from datetime import datetime
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.exc import InvalidRequestError
+from storage import Storage
+from typing import Dict, List
+from user import User
+import threading
+
+COLUMNS = tuple(User.__table__.columns.keys())
+
+
+class MemoryDB(Storage):
+    """
+    Storage backend keeping the users in process memory, for tests and
+    benchmarks
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize a new, empty MemoryDB instance
+        """
+        self._users: Dict[int, User] = {}
+        self._by_email: Dict[str, User] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _next_seq(self) -> int:
+        """
+        Get the change sequence number to stamp the next write with
+        """
+        self._seq += 1
+        return self._seq
+
+    def add_user(self, email: str, hashed_password: str) -> User:
+        """
+        Add a user to memory
+        Args:
+            email (str): user's email
+            hashed_password (str): user's hashed password
+        Return:
+            User
+        """
+        with self._lock:
+            if email in self._by_email:
+                raise ValueError(f"User {email} already exists")
+            user = User(id=len(self._users) + 1, email=email,
+                        hashed_password=hashed_password,
+                        change_seq=self._next_seq())
+            self._users[user.id] = user
+            self._by_email[email] = user
+        return user
+
+    def find_user_by(self, **kwargs) -> User:
+        """
+        Find a user in memory
+        Args:
+            kwargs (dict): dict of key, value pairs representing the
+                           attributes to search by
+        Return:
+            User
+        """
+        for key, value in kwargs.items():
+            if key not in User.__dict__:
+                raise InvalidRequestError
+            if key == "id":
+                user = self._users.get(value)
+            elif key == "email":
+                user = self._by_email.get(value)
+            else:
+                user = next((usr for usr in self._users.values()
+                             if getattr(usr, key) == value), None)
+            if user is not None:
+                return user
+        raise NoResultFound
+
+    def update_user(self, user_id: int, **kwargs) -> None:
+        """
+        Update a user
+        Args:
+            user_id (int): user's id
+            kwargs (dict): dict of key, value pairs representing the
+                           attributes to update
+        """
+        user = self._users.get(user_id)
+        if user is None:
+            raise ValueError()
+        for key in kwargs:
+            if key not in COLUMNS:
+                raise ValueError
+        with self._lock:
+            if "email" in kwargs and \
+                    self._by_email.get(user.email) is user:
+                del self._by_email[user.email]
+            for key, value in kwargs.items():
+                setattr(user, key, value)
+            self._by_email.setdefault(user.email, user)
+            user.change_seq = self._next_seq()
+
+    def purge_reset_tokens(self, now: datetime = None) -> int:
+        """
+        Clear every reset token that expired before now
+        Args:
+            now (datetime): reference time, defaults to the current UTC time
+        Return:
+            number of tokens cleared
+        """
+        if now is None:
+            now = datetime.utcnow()
+        expired = [user for user in self._users.values()
+                   if user.reset_token_expires_at is not None and
+                   user.reset_token_expires_at < now]
+        for user in expired:
+            self.update_user(user.id, reset_token=None,
+                             reset_token_expires_at=None)
+        return len(expired)
+
+    def find_changes(self, since: int) -> List[dict]:
+        """
+        Find the users written after a change sequence number
+        Args:
+            since (int): last change sequence number already seen
+        Return:
+            list of user column values ordered by change sequence
+        """
+        changed = sorted((user for user in self._users.values()
+                          if user.change_seq > since),
+                         key=lambda user: user.change_seq)
+        return [{key: getattr(user, key) for key in COLUMNS}
+                for user in changed]
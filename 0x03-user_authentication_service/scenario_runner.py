@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Asyncio concurrent scenario runner
+
+Runs the checks of main.py as many virtual users against a running
+service and reports the latency of every step, e.g.:
+    ./scenario_runner.py --host http://127.0.0.1:5000 --users 200 \
+        --ramp-up 5 --iterations 3
+
+Every virtual user is a task on one event loop, started on the ramp-up
+schedule, and all of them send their requests through one shared aiohttp
+session pooling up to --users keep-alive connections. The session keeps
+no cookies: the checks pass the session cookie of their user with each
+request, so the users stay independent of each other.
+"""
+from main import BASE_URL, Response, run_scenario, use_client
+from typing import Callable, Dict, List
+from urllib.parse import urljoin
+import aiohttp
+import argparse
+import asyncio
+import sys
+import time
+
+MAX_REDIRECTS = 5
+
+
+class AiohttpClient:
+    """
+    Client sending the requests of the checks through an aiohttp session
+    """
+
+    def __init__(self, session: aiohttp.ClientSession) -> None:
+        """
+        Initialize the client
+        Args:
+            session (aiohttp.ClientSession): session the requests are sent
+                                             through
+        """
+        self._session = session
+
+    async def request(self, method: str, url: str, **kwargs) -> Response:
+        """
+        Send a request, following redirects the way requests does, i.e.
+        with a GET after a 302 or a 303
+        Args:
+            method (str): HTTP method
+            url (str): URL of the request
+            kwargs: data and cookies of the request
+        Return:
+            Response
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            async with self._session.request(method, url,
+                                             allow_redirects=False,
+                                             **kwargs) as resp:
+                text = await resp.text()
+                location = resp.headers.get("Location")
+                if resp.status not in (301, 302, 303, 307, 308) or \
+                        location is None:
+                    return Response(resp.status, text,
+                                    {name: morsel.value for name, morsel
+                                     in resp.cookies.items()},
+                                    str(resp.url))
+            url = urljoin(url, location)
+            if resp.status in (302, 303) or \
+                    (resp.status == 301 and method == "POST"):
+                method = "GET"
+                kwargs.pop("data", None)
+        raise aiohttp.TooManyRedirects(resp.request_info, resp.history)
+
+
+class Stats:
+    """
+    Latencies and failures recorded per step
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize empty stats
+        """
+        self.latencies: Dict[str, List[float]] = {}
+        self.failures: Dict[str, int] = {}
+
+    async def step(self, name: str, check: Callable, *args):
+        """
+        Run a check, recording its latency or its failure
+        Args:
+            name (str): name of the step
+            check (Callable): check to run
+            args: arguments of the check
+        Return:
+            the result of the check
+        """
+        start = time.perf_counter()
+        try:
+            return await check(*args)
+        except (AssertionError, aiohttp.ClientError, asyncio.TimeoutError):
+            self.failures[name] = self.failures.get(name, 0) + 1
+            raise
+        finally:
+            self.latencies.setdefault(name, []).append(
+                time.perf_counter() - start)
+
+    def report(self, elapsed: float) -> str:
+        """
+        Format the per-step latencies and failures as a table
+        Args:
+            elapsed (float): wall-clock duration of the run in seconds
+        Return:
+            the report
+        """
+        lines = [f"{'step':<24} {'count':>6} {'fail':>5} {'p50 ms':>8} "
+                 f"{'p95 ms':>8} {'max ms':>8}"]
+        total = 0
+        for name, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            total += len(latencies)
+            p50 = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1,
+                                int(len(latencies) * 0.95))]
+            lines.append(f"{name:<24} {len(latencies):>6} "
+                         f"{self.failures.get(name, 0):>5} "
+                         f"{p50 * 1000:>8.1f} {p95 * 1000:>8.1f} "
+                         f"{latencies[-1] * 1000:>8.1f}")
+        lines.append(f"{total} requests in {elapsed:.2f}s "
+                     f"({total / elapsed:.1f} req/s)")
+        return "\n".join(lines)
+
+
+async def virtual_user(user: int, iterations: int, delay: float,
+                       stats: Stats) -> int:
+    """
+    Run the scenario repeatedly as one user, once its start time is reached
+    Args:
+        user (int): number of the virtual user
+        iterations (int): number of times the scenario is run
+        delay (float): seconds to wait before starting
+        stats (Stats): stats the steps are recorded in
+    Return:
+        number of failed scenarios
+    """
+    await asyncio.sleep(delay)
+    failed = 0
+    for i in range(iterations):
+        try:
+            await run_scenario(f"vu{user}.{i}.{time.time_ns()}@load.test",
+                               stats.step)
+        except (AssertionError, aiohttp.ClientError, asyncio.TimeoutError):
+            failed += 1
+    return failed
+
+
+async def run(base_url: str, users: int, ramp_up: float,
+              iterations: int) -> int:
+    """
+    Start the virtual users spread over the ramp-up period
+    Args:
+        base_url (str): URL of the service
+        users (int): number of virtual users
+        ramp_up (float): seconds over which the users are started
+        iterations (int): scenarios run by each user
+    Return:
+        number of failed scenarios
+    """
+    stats = Stats()
+    connector = aiohttp.TCPConnector(limit=users)
+    async with aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar()) as session:
+        use_client(AiohttpClient(session), base_url)
+        start = time.perf_counter()
+        failed = await asyncio.gather(*(
+            virtual_user(user, iterations, ramp_up * user / users, stats)
+            for user in range(users)))
+        elapsed = time.perf_counter() - start
+    print(stats.report(elapsed))
+    return sum(failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default=BASE_URL,
+                        help="URL of the service (default: %(default)s)")
+    parser.add_argument("--users", type=int, default=10,
+                        help="virtual users, all running at once")
+    parser.add_argument("--ramp-up", type=float, default=0.0,
+                        help="seconds over which the users are started")
+    parser.add_argument("--iterations", type=int, default=1,
+                        help="scenarios run by each user")
+    args = parser.parse_args()
+    failed = asyncio.run(run(args.host.rstrip("/"), args.users, args.ramp_up,
+                             args.iterations))
+    print(f"{failed} failed scenarios")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+The storage module
+
+Defines the interface every user storage backend implements, and
+get_db, which picks a backend from a database URL:
+    memory://          MemoryDB, users held in process memory
+    sqlite:///<path>   SQLiteDB, SQLite in write-ahead logging mode
+    any other URL      DB, any database SQLAlchemy can connect to
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from sqlalchemy.orm.exc import NoResultFound
+from typing import Dict, Iterable, List
+from user import User
+
+
+class Storage(ABC):
+    """
+    The storage backend interface
+    """
+
+    @abstractmethod
+    def add_user(self, email: str, hashed_password: str) -> User:
+        """
+        Add a user to the storage, raising ValueError when the email is
+        already used
+        Args:
+            email (str): user's email
+            hashed_password (str): user's hashed password
+        Return:
+            User
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_user_by(self, **kwargs) -> User:
+        """
+        Find a user, raising NoResultFound when there is none and
+        InvalidRequestError for an unknown attribute
+        Args:
+            kwargs (dict): dict of key, value pairs representing the
+                           attributes to search by
+        Return:
+            User
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_user(self, user_id: int, **kwargs) -> None:
+        """
+        Update a user, raising ValueError for an unknown user or attribute
+        Args:
+            user_id (int): user's id
+            kwargs (dict): dict of key, value pairs representing the
+                           attributes to update
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_reset_tokens(self, now: datetime = None) -> int:
+        """
+        Clear every reset token that expired before now
+        Args:
+            now (datetime): reference time, defaults to the current UTC time
+        Return:
+            number of tokens cleared
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_changes(self, since: int) -> List[dict]:
+        """
+        Find the users written after a change sequence number
+        Args:
+            since (int): last change sequence number already seen
+        Return:
+            list of user column values ordered by change sequence
+        """
+        raise NotImplementedError
+
+    def find_user_ids(self, emails: Iterable[str]) -> Dict[str, int]:
+        """
+        Find the ids of the users owning the given emails
+        Args:
+            emails (Iterable[str]): emails to look up
+        Return:
+            user id keyed by email, unknown emails are left out
+        """
+        ids = {}
+        for email in emails:
+            try:
+                ids[email] = self.find_user_by(email=email).id
+            except NoResultFound:
+                continue
+        return ids
+
+    def set_reset_tokens(self, tokens: Dict[int, str],
+                         expires_at: datetime) -> None:
+        """
+        Set the reset tokens of many users
+        Args:
+            tokens (dict): reset token keyed by user id
+            expires_at (datetime): expiry of every token in the batch
+        """
+        for user_id, token in tokens.items():
+            self.update_user(user_id, reset_token=token,
+                             reset_token_expires_at=expires_at)
+
+    def set_last_seen(self, times: Dict[int, datetime]) -> None:
+        """
+        Set the session last-seen time of many users
+        Args:
+            times (dict): last-seen time keyed by user id
+        """
+        for user_id, when in times.items():
+            self.update_user(user_id, session_last_seen=when)
+
+    def remove(self) -> None:
+        """
+        Release the resources the calling thread holds, e.g. at the end
+        of a request
+        """
+
+    def close(self) -> None:
+        """
+        Release the resources held by the storage
+        """
+
+
+def get_db(url: str = "sqlite:///a.db", reset: bool = True) -> Storage:
+    """
+    Build the storage backend matching a database URL
+    Args:
+        url (str): "memory://" or a SQLAlchemy database URL
+        reset (bool): drop and recreate the schema when True
+    Return:
+        Storage
+    """
+    if url == "memory://":
+        from memory_db import MemoryDB
+        return MemoryDB()
+    if url.startswith("sqlite:///") and url != "sqlite:///:memory:":
+        from db import SQLiteDB
+        return SQLiteDB(url, reset)
+    from db import DB
+    return DB(url, reset)
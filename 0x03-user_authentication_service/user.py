@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
-"""SQLAlchemy model for the 'users' table."""
-from sqlalchemy import Column, Integer, String
+"""SQLAlchemy models for the 'users' and 'change_sequence' tables."""
+from sqlalchemy import Column, DateTime, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -11,7 +11,19 @@ class User(Base):
     __tablename__ = 'users'
 
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
     session_id = Column(String(250), nullable=True)
+    session_last_seen = Column(DateTime, nullable=True)
     reset_token = Column(String(250), nullable=True)
+    reset_token_expires_at = Column(DateTime, nullable=True)
+    change_seq = Column(Integer, nullable=False, default=0, index=True)
+
+
+class ChangeSequence(Base):
+    """SQLAlchemy model for the one-row 'change_sequence' table holding the
+    last change sequence number stamped on a user."""
+    __tablename__ = 'change_sequence'
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)